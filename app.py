@@ -1,9 +1,8 @@
 import streamlit as st
 import sqlite3
-from datetime import datetime, date, time as dtime
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from datetime import datetime, date, time as dtime, timedelta
+import concurrent.futures
+import io
 import os
 
 DB_PATH = "carepilot.db"
@@ -17,7 +16,10 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded",
 )
-st.markdown("""
+# Built once at import; re-emitted each rerun because Streamlit drops
+# elements (including injected <style>) that a rerun does not produce,
+# so caching the st.markdown call itself would lose the styling.
+_CSS = """
 <style>
 .kpi-row{
   display:grid;
@@ -63,17 +65,39 @@ st.markdown("""
   .kpi-row{ grid-template-columns: repeat(2, minmax(0, 1fr)); }
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_CSS, unsafe_allow_html=True)
+
+NAV_PAGES = ("📊 Dashboard", "👤 Profile", "💊 Medications", "📅 Appointments", "📝 Daily Check-in")
 
 
 
 # -------------------------
 # Database helpers
 # -------------------------
+@st.cache_resource
 def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    # One connection per process, shared across reruns. Opening a fresh
+    # connection for every helper call made each rerun pay the connect +
+    # schema-load cost 7-10 times over.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    # WAL + synchronous=NORMAL drops the per-commit fsync that dominated
+    # single-row insert cost; temp_store keeps sort b-trees off disk;
+    # mmap_size serves the read-mostly dashboard straight from the OS page
+    # cache; cache_size gives SQLite a 64MB page cache.
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA cache_size=-65536;
+    """)
+    return conn
 
+@st.cache_resource
 def init_db():
+    # Cached so the CREATE TABLE/TRIGGER/INDEX statements compile once per
+    # process instead of on every rerun of main().
     conn = get_conn()
     cur = conn.cursor()
 
@@ -85,7 +109,7 @@ def init_db():
         relationship TEXT,
         age INTEGER,
         conditions TEXT,
-        created_at TEXT NOT NULL
+        created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now'))
     )
     """)
 
@@ -98,7 +122,7 @@ def init_db():
         schedule TEXT,
         notes TEXT,
         active INTEGER NOT NULL DEFAULT 1,
-        created_at TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
         FOREIGN KEY(recipient_id) REFERENCES care_recipient(id)
     )
     """)
@@ -106,14 +130,26 @@ def init_db():
     cur.execute("""
     CREATE TABLE IF NOT EXISTS med_log (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
+        recipient_id INTEGER NOT NULL,
         medication_id INTEGER NOT NULL,
         log_date TEXT NOT NULL,
         status TEXT NOT NULL,          -- taken/missed
-        logged_at TEXT NOT NULL,
+        logged_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+        FOREIGN KEY(recipient_id) REFERENCES care_recipient(id),
         FOREIGN KEY(medication_id) REFERENCES medications(id)
     )
     """)
 
+    # Migrate databases created before recipient_id was denormalized onto
+    # med_log; the column lets dashboard reads skip the medications join.
+    medlog_cols = {row[1] for row in cur.execute("PRAGMA table_info(med_log)")}
+    if "recipient_id" not in medlog_cols:
+        cur.execute("ALTER TABLE med_log ADD COLUMN recipient_id INTEGER")
+        cur.execute("""
+            UPDATE med_log SET recipient_id =
+                (SELECT recipient_id FROM medications WHERE medications.id = med_log.medication_id)
+        """)
+
     cur.execute("""
     CREATE TABLE IF NOT EXISTS appointments (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -123,7 +159,7 @@ def init_db():
         purpose TEXT,
         location TEXT,
         notes TEXT,
-        created_at TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
         FOREIGN KEY(recipient_id) REFERENCES care_recipient(id)
     )
     """)
@@ -137,115 +173,304 @@ def init_db():
         symptom_severity INTEGER,      -- 0-10
         caregiver_stress INTEGER,      -- 0-10
         free_text TEXT,
-        created_at TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
         FOREIGN KEY(recipient_id) REFERENCES care_recipient(id)
     )
     """)
 
-    conn.commit()
-    conn.close()
+    # Per-recipient, per-day rollup kept current by triggers, so charts and
+    # adherence stats read a bounded number of pre-aggregated rows instead
+    # of re-grouping the raw logs on every rerun.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS daily_rollup (
+        recipient_id INTEGER NOT NULL,
+        d TEXT NOT NULL,
+        taken INTEGER NOT NULL DEFAULT 0,
+        missed INTEGER NOT NULL DEFAULT 0,
+        sev_max INTEGER,
+        stress_max INTEGER,
+        PRIMARY KEY (recipient_id, d)
+    )
+    """)
 
-def query_df(sql, params=None):
-    conn = get_conn()
-    df = pd.read_sql_query(sql, conn, params=params or [])
-    conn.close()
-    return df
+    cur.execute("DROP TRIGGER IF EXISTS trg_medlog_rollup")
+    cur.execute("""
+    CREATE TRIGGER trg_medlog_rollup AFTER INSERT ON med_log
+    BEGIN
+        INSERT INTO daily_rollup (recipient_id, d, taken, missed)
+        VALUES (NEW.recipient_id, NEW.log_date, NEW.status = 'taken', NEW.status = 'missed')
+        ON CONFLICT(recipient_id, d) DO UPDATE SET
+            taken = taken + excluded.taken,
+            missed = missed + excluded.missed;
+    END
+    """)
+
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_checkins_rollup AFTER INSERT ON checkins
+    BEGIN
+        INSERT INTO daily_rollup (recipient_id, d, sev_max, stress_max)
+        VALUES (NEW.recipient_id, NEW.checkin_date, NEW.symptom_severity, NEW.caregiver_stress)
+        ON CONFLICT(recipient_id, d) DO UPDATE SET
+            sev_max = CASE
+                WHEN excluded.sev_max IS NULL THEN sev_max
+                WHEN sev_max IS NULL OR excluded.sev_max > sev_max THEN excluded.sev_max
+                ELSE sev_max END,
+            stress_max = CASE
+                WHEN excluded.stress_max IS NULL THEN stress_max
+                WHEN stress_max IS NULL OR excluded.stress_max > stress_max THEN excluded.stress_max
+                ELSE stress_max END;
+    END
+    """)
+
+    # Backfill once for databases created before the rollup existed.
+    if cur.execute("SELECT NOT EXISTS (SELECT 1 FROM daily_rollup)").fetchone()[0]:
+        cur.execute("""
+            INSERT INTO daily_rollup (recipient_id, d, taken, missed)
+            SELECT recipient_id, log_date,
+                   SUM(status = 'taken'), SUM(status = 'missed')
+            FROM med_log
+            GROUP BY recipient_id, log_date
+        """)
+        cur.execute("""
+            INSERT INTO daily_rollup (recipient_id, d, sev_max, stress_max)
+            SELECT recipient_id, checkin_date,
+                   MAX(symptom_severity), MAX(caregiver_stress)
+            FROM checkins
+            GROUP BY recipient_id, checkin_date
+            ON CONFLICT(recipient_id, d) DO UPDATE SET
+                sev_max = excluded.sev_max,
+                stress_max = excluded.stress_max
+        """)
+
+    # Composite indexes backing the dashboard filters: leading equality
+    # column (recipient/medication id), then the ranged date column.
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_checkins_recipient_date ON checkins(recipient_id, checkin_date DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_appts_recipient_dt ON appointments(recipient_id, appt_datetime)")
+    cur.execute("DROP INDEX IF EXISTS idx_medlog_medid_date")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_medlog_recipient_date ON med_log(recipient_id, log_date DESC, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_meds_recipient ON medications(recipient_id, active)")
 
-def execute(sql, params=None):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(sql, params or [])
     conn.commit()
-    conn.close()
+
+def query_df(sql, params=None, conn=None):
+    # pandas is imported lazily (like reportlab below): it costs ~1s of
+    # import time and only the chart/table pages actually need frames.
+    import pandas as pd
+
+    conn = conn or get_conn()
+    return pd.read_sql_query(sql, conn, params=params or [])
+
+def query_rows(sql, params=None, conn=None):
+    """Fetch plain tuples — pandas DataFrame construction dwarfs the query
+    itself on the tiny result sets the risk/summary path works with."""
+    conn = conn or get_conn()
+    return conn.execute(sql, params or []).fetchall()
+
+def execute(sql, params=None, conn=None):
+    conn = conn or get_conn()
+    # `with conn:` wraps the statement in one transaction: a single
+    # commit/fsync on success, automatic rollback on error.
+    with conn:
+        conn.execute(sql, params or [])
+    _bump_data_version()
+
+def execute_many(sql, rows, conn=None):
+    conn = conn or get_conn()
+    with conn:
+        conn.executemany(sql, rows)
+    _bump_data_version()
+
+# Hot per-rerun statements live in module constants so every call passes
+# byte-identical SQL text and hits SQLite's per-connection compiled-
+# statement cache instead of re-parsing and re-planning.
+_SQL_HAS_DATA = """
+SELECT EXISTS(SELECT 1 FROM medications WHERE recipient_id = ?),
+       EXISTS(SELECT 1 FROM checkins WHERE recipient_id = ?),
+       EXISTS(SELECT 1 FROM appointments WHERE recipient_id = ?)
+"""
+
+_SQL_RECIPIENTS = """
+SELECT id, first_name, last_name, relationship, age
+FROM care_recipient
+ORDER BY id DESC
+"""
+
+def data_version():
+    """Monotonic counter bumped by every write in this session; used as a
+    cache key so reads after a write see fresh data without a DB probe."""
+    return st.session_state.setdefault("data_version", 0)
+
+def _bump_data_version():
+    st.session_state["data_version"] = st.session_state.get("data_version", 0) + 1
 
 def reset_db():
+    get_conn().close()
+    # Drops both the cached connection and the run-once init_db marker,
+    # so a later rerun reconnects and recreates the schema.
+    st.cache_resource.clear()
+    st.cache_data.clear()
     if os.path.exists(DB_PATH):
         os.remove(DB_PATH)
 
 # -------------------------
 # Rule-based "AI" risk flags
 # -------------------------
-def generate_risk_flags(recipient_id: int):
+# One round trip for everything the dashboard needs. Each arm is tagged with
+# a `k` column so Python can split the result; previously the same tables
+# were scanned by 7 separate queries with overlapping date windows.
+_SQL_DASHBOARD = """
+WITH med_missed AS (
+    SELECT DISTINCT m.med_name
+    FROM med_log ml
+    JOIN medications m ON m.id = ml.medication_id
+    WHERE ml.recipient_id = :rid
+      AND ml.status = 'missed'
+      AND ml.log_date >= :d3
+),
+checkin_window AS (
+    SELECT checkin_date, symptom_severity, caregiver_stress
+    FROM checkins
+    WHERE recipient_id = :rid
+      AND checkin_date >= :d7
+),
+last3 AS (
+    SELECT checkin_date, symptom_severity
+    FROM checkins
+    WHERE recipient_id = :rid
+    ORDER BY checkin_date DESC
+    LIMIT 3
+),
+next_appt AS (
+    SELECT appt_datetime, provider, purpose
+    FROM appointments
+    WHERE recipient_id = :rid
+      AND appt_datetime >= :now
+      AND appt_datetime <= :a14
+    ORDER BY appt_datetime ASC
+    LIMIT 1
+)
+SELECT 'adherence' AS k, SUM(taken) AS a, SUM(missed) AS b, NULL AS c, NULL AS d
+FROM daily_rollup
+WHERE recipient_id = :rid AND d >= :d7
+UNION ALL
+SELECT 'missed3', med_name, NULL, NULL, NULL FROM med_missed
+UNION ALL
+SELECT 'last3', checkin_date, symptom_severity, NULL, NULL FROM last3
+UNION ALL
+SELECT 'checkin', checkin_date, symptom_severity, caregiver_stress, NULL FROM checkin_window
+UNION ALL
+SELECT 'appt', appt_datetime, provider, purpose, NULL FROM next_appt
+"""
+
+# Split comma/semicolon-separated symptom strings inside SQLite; only the
+# final deduplicated keywords cross back into Python.
+_SQL_SYMPTOM_KEYWORDS = """
+WITH RECURSIVE split(word, rest) AS (
+    SELECT '', replace(lower(symptoms), ';', ',') || ','
+    FROM checkins
+    WHERE recipient_id = ? AND checkin_date >= ? AND symptoms IS NOT NULL
+    UNION ALL
+    SELECT trim(substr(rest, 1, instr(rest, ',') - 1)),
+           substr(rest, instr(rest, ',') + 1)
+    FROM split WHERE rest != ''
+)
+SELECT DISTINCT word FROM split WHERE word != '' ORDER BY word LIMIT 6
+"""
+
+def fetch_dashboard_data(recipient_id: int, today: date, now: datetime):
+    """Run the dashboard megaquery once and split the tagged rows.
+
+    `today`/`now` are read once per summary build by the caller, so every
+    window and flag in one build shares the same clock.
+    """
+    # Dates are stored as ISO strings, so lexicographic >= against a
+    # Python-computed cutoff is chronological and keeps the column bare —
+    # wrapping it in date() would defeat the indexes added in init_db.
+    rows = query_rows(_SQL_DASHBOARD, {
+        "rid": recipient_id,
+        "d7": (today - timedelta(days=7)).isoformat(),
+        "d3": (today - timedelta(days=3)).isoformat(),
+        "now": now.isoformat(),
+        "a14": (now + timedelta(days=14)).isoformat(),
+    })
+
+    data = {
+        "taken": 0,
+        "missed": 0,
+        "missed_meds": [],   # distinct med names missed in last 3 days
+        "last3": [],         # (checkin_date, severity), oldest -> newest
+        "checkins": [],      # (checkin_date, severity, stress), 7d window
+        "appt": None,        # (appt_datetime, provider, purpose) within 14 days
+    }
+    for k, a, b, c, d in rows:
+        if k == "adherence":
+            data["taken"] = a or 0
+            data["missed"] = b or 0
+        elif k == "missed3":
+            data["missed_meds"].append(a)
+        elif k == "last3":
+            data["last3"].append((a, b))
+        elif k == "checkin":
+            data["checkins"].append((a, b, c))
+        elif k == "appt":
+            data["appt"] = (a, b or "", c or "")
+
+    # UNION ALL does not guarantee inner ordering; sort by date client-side.
+    data["last3"].sort(key=lambda t: t[0])
+    data["checkins"].sort(key=lambda t: t[0])
+    return data
+
+def generate_risk_flags(recipient_id: int, data, now: datetime):
+    # `data` always comes from the single fetch_dashboard_data round trip
+    # made by build_ai_summary; this function never queries on its own.
     flags = []
 
-    missed = query_df("""
-        SELECT ml.log_date, m.med_name
-        FROM med_log ml
-        JOIN medications m ON m.id = ml.medication_id
-        WHERE m.recipient_id = ?
-          AND ml.status = 'missed'
-          AND date(ml.log_date) >= date('now','-3 day')
-    """, [recipient_id])
-
-    if not missed.empty:
-        meds = ", ".join(sorted(set(missed["med_name"].tolist())))
-        flags.append({"level": "High", "title": "Missed medications recently",
+    if data["missed_meds"]:
+        meds = ", ".join(sorted(set(data["missed_meds"])))
+        flags.append({"key": "missed_meds", "level": "High", "title": "Missed medications recently",
                       "detail": f"Missed med(s) in last 3 days: {meds}."})
 
-    last3 = query_df("""
-        SELECT checkin_date, symptom_severity
-        FROM checkins
-        WHERE recipient_id = ?
-        ORDER BY date(checkin_date) DESC
-        LIMIT 3
-    """, [recipient_id])
-
-    if len(last3) == 3:
-        sev = list(reversed(last3["symptom_severity"].tolist()))
+    if len(data["last3"]) == 3:
+        sev = [s for _, s in data["last3"]]
         if all(s is not None for s in sev):
             if sev[2] >= sev[1] >= sev[0] and (sev[2] - sev[0]) >= 3:
-                flags.append({"level": "High", "title": "Symptoms worsening trend",
+                flags.append({"key": "worsening", "level": "High", "title": "Symptoms worsening trend",
                               "detail": f"Severity rose from {sev[0]} to {sev[2]} over the last 3 check-ins."})
             elif sev[2] >= 7:
-                flags.append({"level": "Medium", "title": "High symptom severity",
+                flags.append({"key": "high_severity", "level": "Medium", "title": "High symptom severity",
                               "detail": f"Latest symptom severity is {sev[2]}/10."})
 
-    stress = query_df("""
-        SELECT caregiver_stress
-        FROM checkins
-        WHERE recipient_id = ?
-          AND caregiver_stress IS NOT NULL
-          AND date(checkin_date) >= date('now','-7 day')
-    """, [recipient_id])
-
-    if not stress.empty and (stress["caregiver_stress"] >= 8).any():
-        flags.append({"level": "Medium", "title": "Caregiver burnout risk",
+    if any(stress is not None and stress >= 8 for _, _, stress in data["checkins"]):
+        flags.append({"key": "burnout", "level": "Medium", "title": "Caregiver burnout risk",
                       "detail": "Stress hit 8+ in the last 7 days."})
 
-    upcoming = query_df("""
-        SELECT appt_datetime, provider, purpose
-        FROM appointments
-        WHERE recipient_id = ?
-          AND datetime(appt_datetime) >= datetime('now')
-          AND datetime(appt_datetime) <= datetime('now','+2 day')
-        ORDER BY datetime(appt_datetime) ASC
-        LIMIT 1
-    """, [recipient_id])
-
-    if not upcoming.empty:
-        ap = upcoming.iloc[0]
-        flags.append({"level": "Low", "title": "Upcoming appointment soon",
-                      "detail": f"{ap['appt_datetime']} — {ap.get('provider','')} ({ap.get('purpose','')})"})
+    if data["appt"] is not None:
+        appt_dt, provider, purpose = data["appt"]
+        soon_cutoff = (now + timedelta(days=2)).isoformat()
+        if appt_dt <= soon_cutoff:
+            flags.append({"key": "appt_soon", "level": "Low", "title": "Upcoming appointment soon",
+                          "detail": f"{appt_dt} — {provider} ({purpose})"})
 
     return flags
 
 def next_step_suggestions(flags):
-    titles = [f["title"] for f in flags]
-    levels = [f["level"] for f in flags]
+    # Flags carry stable keys, so dispatch is O(1) set membership instead
+    # of substring scans over the display titles.
+    keys = {f["key"] for f in flags}
     suggestions = []
 
-    if "High" in levels and any("Missed medications" in t for t in titles):
+    if "missed_meds" in keys:
         suggestions.append("Review medication schedule and set a double reminder (alarm + checklist).")
         suggestions.append("Ask a family member to confirm meds for the next 2–3 days.")
 
-    if "High" in levels and any("Symptoms worsening trend" in t for t in titles):
+    if "worsening" in keys:
         suggestions.append("Contact the provider/clinic and describe the symptom trend using your logs.")
         suggestions.append("Write down: when symptoms started, what changed, and what helps.")
 
-    if any("Caregiver burnout risk" in t for t in titles):
+    if "burnout" in keys:
         suggestions.append("Delegate one task this week and schedule a daily recovery break.")
 
-    if any("Upcoming appointment soon" in t for t in titles):
+    if "appt_soon" in keys:
         suggestions.append("Prepare 3 questions and bring a med list + symptom timeline.")
 
     if not suggestions:
@@ -256,65 +481,47 @@ def next_step_suggestions(flags):
 # -------------------------
 # AI Summary (Mock AI)
 # -------------------------
-def build_ai_summary(recipient_id: int):
-    med_stats = query_df("""
-        SELECT ml.status, COUNT(*) AS cnt
-        FROM med_log ml
-        JOIN medications m ON m.id = ml.medication_id
-        WHERE m.recipient_id = ?
-          AND date(ml.log_date) >= date('now','-7 day')
-        GROUP BY ml.status
-    """, [recipient_id])
+@st.cache_data(ttl=60, max_entries=64, show_spinner=False)
+def build_ai_summary(recipient_id: int, version=None):
+    # `version` comes from data_version(); it only serves as part of the
+    # cache key so a rerun that wrote no data becomes a dict lookup. The
+    # short ttl keeps the 'now'-relative windows from going stale.
+    today = date.today()
+    now = datetime.utcnow()
+    exists = query_rows(_SQL_HAS_DATA, [recipient_id, recipient_id, recipient_id])[0]
+    if not any(exists):
+        # Freshly added recipient: one EXISTS probe instead of the full
+        # megaquery that would return nothing but empty windows.
+        data = {"taken": 0, "missed": 0, "missed_meds": [],
+                "last3": [], "checkins": [], "appt": None}
+    else:
+        data = fetch_dashboard_data(recipient_id, today, now)
 
-    taken = missed = 0
-    if not med_stats.empty:
-        for _, r in med_stats.iterrows():
-            if r["status"] == "taken":
-                taken = int(r["cnt"])
-            if r["status"] == "missed":
-                missed = int(r["cnt"])
+    taken = data["taken"]
+    missed = data["missed"]
     total_logs = taken + missed
     adherence_rate = round((taken / total_logs) * 100) if total_logs > 0 else None
 
-    checks = query_df("""
-        SELECT checkin_date, symptoms, symptom_severity, caregiver_stress, free_text
-        FROM checkins
-        WHERE recipient_id = ?
-          AND date(checkin_date) >= date('now','-7 day')
-        ORDER BY date(checkin_date) ASC
-    """, [recipient_id])
-
     earliest_sev = latest_sev = None
     max_stress = None
     symptom_keywords = []
 
-    if not checks.empty:
-        earliest_sev = int(checks.iloc[0]["symptom_severity"]) if pd.notna(checks.iloc[0]["symptom_severity"]) else None
-        latest_sev = int(checks.iloc[-1]["symptom_severity"]) if pd.notna(checks.iloc[-1]["symptom_severity"]) else None
-        if checks["caregiver_stress"].notna().any():
-            max_stress = int(checks["caregiver_stress"].max())
+    if data["checkins"]:
+        earliest_sev = data["checkins"][0][1]
+        latest_sev = data["checkins"][-1][1]
+        stresses = [s for _, _, s in data["checkins"] if s is not None]
+        if stresses:
+            max_stress = max(stresses)
 
-        for s in checks["symptoms"].dropna().tolist():
-            parts = [p.strip().lower() for p in s.replace(";", ",").split(",")]
-            symptom_keywords.extend([p for p in parts if p])
-        symptom_keywords = sorted(set(symptom_keywords))[:6]
-
-    up = query_df("""
-        SELECT appt_datetime, provider, purpose
-        FROM appointments
-        WHERE recipient_id = ?
-          AND datetime(appt_datetime) >= datetime('now')
-          AND datetime(appt_datetime) <= datetime('now','+14 day')
-        ORDER BY datetime(appt_datetime) ASC
-        LIMIT 1
-    """, [recipient_id])
+        d7 = (today - timedelta(days=7)).isoformat()
+        symptom_keywords = [w for (w,) in query_rows(_SQL_SYMPTOM_KEYWORDS, [recipient_id, d7])]
 
     upcoming_text = None
-    if not up.empty:
-        ap = up.iloc[0]
-        upcoming_text = f"{ap['appt_datetime']} — {ap.get('provider','')} ({ap.get('purpose','')})"
+    if data["appt"] is not None:
+        appt_dt, provider, purpose = data["appt"]
+        upcoming_text = f"{appt_dt} — {provider} ({purpose})"
 
-    flags = generate_risk_flags(recipient_id)
+    flags = generate_risk_flags(recipient_id, data, now)
     levels = [f["level"] for f in flags]
     status = "Stable"
     if "High" in levels:
@@ -360,22 +567,38 @@ def build_ai_summary(recipient_id: int):
 # -------------------------
 # Charts (Streamlit native)
 # -------------------------
+_SQL_TREND_30D = """
+SELECT d AS checkin_date, sev_max AS symptom_severity, stress_max AS caregiver_stress
+FROM daily_rollup
+WHERE recipient_id = ?
+  AND d >= ?
+  AND (sev_max IS NOT NULL OR stress_max IS NOT NULL)
+ORDER BY d ASC
+"""
+
+_SQL_ADHERENCE_14D = """
+SELECT d AS log_date, taken, missed
+FROM daily_rollup
+WHERE recipient_id = ?
+  AND d >= ?
+  AND (taken > 0 OR missed > 0)
+ORDER BY d ASC
+"""
+
 def render_charts(recipient_id: int):
+    import pandas as pd
+
     st.markdown("### Trends (last 30 days)")
 
-    cdf = query_df("""
-        SELECT checkin_date, symptom_severity, caregiver_stress
-        FROM checkins
-        WHERE recipient_id = ?
-          AND date(checkin_date) >= date('now','-30 day')
-        ORDER BY date(checkin_date) ASC
-    """, [recipient_id])
+    cdf = query_df(_SQL_TREND_30D, [recipient_id, (date.today() - timedelta(days=30)).isoformat()])
 
     if cdf.empty:
         st.info("No check-in data available for charts yet.")
         return
 
-    cdf["checkin_date"] = pd.to_datetime(cdf["checkin_date"])
+    # Rollup dates are ISO day strings; the explicit format skips pandas'
+    # generic dateutil-based parser.
+    cdf["checkin_date"] = pd.to_datetime(cdf["checkin_date"], format="%Y-%m-%d")
     cdf = cdf.set_index("checkin_date")[["symptom_severity", "caregiver_stress"]]
 
     c1, c2 = st.columns(2)
@@ -389,26 +612,15 @@ def render_charts(recipient_id: int):
         st.line_chart(cdf[["caregiver_stress"]])
         st.markdown("</div>", unsafe_allow_html=True)
 
-    mdf = query_df("""
-        SELECT ml.log_date, ml.status
-        FROM med_log ml
-        JOIN medications m ON m.id = ml.medication_id
-        WHERE m.recipient_id = ?
-          AND date(ml.log_date) >= date('now','-14 day')
-    """, [recipient_id])
+    mdf = query_df(_SQL_ADHERENCE_14D, [recipient_id, (date.today() - timedelta(days=14)).isoformat()])
 
     st.markdown("### Medication adherence (last 14 days)")
     if mdf.empty:
         st.info("No medication logs available for adherence chart yet.")
         return
 
-    mdf["log_date"] = pd.to_datetime(mdf["log_date"])
-    daily = mdf.groupby(["log_date", "status"]).size().unstack(fill_value=0).reset_index()
-    if "taken" not in daily.columns:
-        daily["taken"] = 0
-    if "missed" not in daily.columns:
-        daily["missed"] = 0
-    daily = daily.set_index("log_date")[["taken", "missed"]]
+    mdf["log_date"] = pd.to_datetime(mdf["log_date"], format="%Y-%m-%d")
+    daily = mdf.set_index("log_date")[["taken", "missed"]]
 
     st.markdown("<div class='card'><h3>Medication logs</h3><div class='muted'>Taken vs missed</div>", unsafe_allow_html=True)
     st.line_chart(daily)
@@ -417,8 +629,22 @@ def render_charts(recipient_id: int):
 # -------------------------
 # PDF Export
 # -------------------------
-def generate_doctor_summary_pdf(filename: str, recipient_name: str, summary_lines, actions, flags):
-    c = canvas.Canvas(filename, pagesize=letter)
+@st.cache_resource
+def _pdf_pool():
+    # cache_resource makes this a true process-wide singleton; a module-
+    # level executor would be rebuilt on every rerun because Streamlit
+    # re-executes the script top to bottom. Single worker so concurrent
+    # sessions queue their renders instead of contending.
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+def generate_doctor_summary_pdf(recipient_name: str, summary_lines, actions, flags) -> bytes:
+    # Imported lazily: reportlab scans font directories on import, and most
+    # sessions never export a PDF.
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
     width, height = letter
 
     y = height - 60
@@ -472,26 +698,42 @@ def generate_doctor_summary_pdf(filename: str, recipient_name: str, summary_line
                 y = height - 60
 
     c.save()
+    return buf.getvalue()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_pdf_bytes(recipient_id, version, recipient_name, summary_lines, actions, flag_rows):
+    """PDF bytes keyed by recipient and data version, so repeat downloads
+    of an unchanged summary skip the reportlab render."""
+    flags = [{"level": lvl, "title": title, "detail": detail}
+             for lvl, title, detail in flag_rows]
+    fut = _pdf_pool().submit(generate_doctor_summary_pdf,
+                           recipient_name, list(summary_lines), list(actions), flags)
+    with st.spinner("Preparing doctor summary PDF..."):
+        return fut.result()
 
 # -------------------------
 # UI helpers
 # -------------------------
+@st.cache_data(ttl=60, show_spinner=False)
+def _recipients(version):
+    # Keyed on the session write counter: one SELECT per data mutation
+    # instead of one per rerun of every page. The counter is per-session,
+    # so the ttl (same as build_ai_summary) bounds how long another
+    # session can miss a recipient added elsewhere.
+    return query_rows(_SQL_RECIPIENTS)
+
 def select_recipient():
-    recipients = query_df("""
-        SELECT id, first_name, last_name, relationship, age
-        FROM care_recipient
-        ORDER BY id DESC
-    """)
-    if recipients.empty:
+    rows = _recipients(data_version())
+    if not rows:
         st.info("No care recipient yet. Add one in **Profile**.")
         return None, None
 
     options = {
-        f"{row['first_name']} {row['last_name']} • {row.get('relationship','')} • {row.get('age','?')}y": int(row["id"])
-        for _, row in recipients.iterrows()
+        f"{fn} {ln} • {rel or ''} • {age if age is not None else '?'}y": (rid, f"{fn} {ln}")
+        for rid, fn, ln, rel, age in rows
     }
     choice = st.selectbox("Care recipient", list(options.keys()))
-    return options[choice], choice.split(" • ")[0]
+    return options[choice]
 
 def badge(level: str):
     level = level.lower()
@@ -524,6 +766,10 @@ def page_profile():
         if not first_name.strip() or not last_name.strip():
             st.error("First and last name are required.")
         else:
+            # created_at is bound explicitly rather than left to the column
+            # DEFAULT: CREATE TABLE IF NOT EXISTS does not add the DEFAULT
+            # clause to tables created before it existed, and those older
+            # tables still carry the NOT NULL constraint.
             execute("""
                 INSERT INTO care_recipient (first_name, last_name, relationship, age, conditions, created_at)
                 VALUES (?,?,?,?,?,?)
@@ -564,47 +810,66 @@ def page_medications(recipient_id):
             execute("""
                 INSERT INTO medications (recipient_id, med_name, dose, schedule, notes, active, created_at)
                 VALUES (?,?,?,?,?,1,?)
-            """, [recipient_id, med_name.strip(), dose.strip(), schedule.strip(), notes.strip(), datetime.utcnow().isoformat()])
+            """, [recipient_id, med_name.strip(), dose.strip(), schedule.strip(), notes.strip(),
+                   datetime.utcnow().isoformat()])
             st.success("Medication added.")
 
-    meds = query_df("""
+    meds = query_rows("""
         SELECT id, med_name, dose, schedule, notes, active
         FROM medications
         WHERE recipient_id = ?
         ORDER BY id DESC
     """, [recipient_id])
 
-    if meds.empty:
+    if not meds:
         st.info("No medications yet.")
         return
 
+    import pandas as pd
+
     st.markdown("<div class='card'><h3>Current medications</h3></div>", unsafe_allow_html=True)
-    st.dataframe(meds.drop(columns=["id"]), use_container_width=True)
+    st.dataframe(
+        pd.DataFrame(meds, columns=["id", "med_name", "dose", "schedule", "notes", "active"]).drop(columns=["id"]),
+        use_container_width=True
+    )
 
-    st.markdown("<div class='card'><h3>Log today</h3><div class='muted'>One click per medication</div>", unsafe_allow_html=True)
+    st.markdown("<div class='card'><h3>Log today</h3><div class='muted'>Tick each medication, save once</div>", unsafe_allow_html=True)
     today_str = date.today().isoformat()
-
-    for _, row in meds.iterrows():
-        if int(row["active"]) != 1:
-            continue
-        med_id = int(row["id"])
-        label = f"**{row['med_name']}** • {row.get('dose','')} • {row.get('schedule','')}"
-        c1, c2, c3 = st.columns([5, 1, 1])
-        c1.markdown(label)
-
-        if c2.button("✅ Taken", key=f"taken_{med_id}"):
-            execute("""
-                INSERT INTO med_log (medication_id, log_date, status, logged_at)
-                VALUES (?,?,?,?)
-            """, [med_id, today_str, "taken", datetime.utcnow().isoformat()])
-            st.success(f"Logged taken: {row['med_name']}")
-
-        if c3.button("❌ Missed", key=f"missed_{med_id}"):
-            execute("""
-                INSERT INTO med_log (medication_id, log_date, status, logged_at)
-                VALUES (?,?,?,?)
-            """, [med_id, today_str, "missed", datetime.utcnow().isoformat()])
-            st.warning(f"Logged missed: {row['med_name']}")
+    active_meds = [(mid, name, dose, schedule)
+                   for mid, name, dose, schedule, _notes, active in meds
+                   if int(active) == 1]
+
+    # A form batches the whole grid into one rerun and one transaction,
+    # instead of a rerun + single-row commit per button click.
+    # clear_on_submit unticks everything after a save, so a second press
+    # of the button cannot re-insert the previous submission; the return
+    # values are captured here because the widget keys are already reset
+    # by the time the submit rerun reads session_state.
+    ticks = {}
+    with st.form("log_today", clear_on_submit=True):
+        for med_id, med_name, dose, schedule in active_meds:
+            c1, c2, c3 = st.columns([5, 1, 1])
+            c1.markdown(f"**{med_name}** • {dose or ''} • {schedule or ''}")
+            ticks[med_id] = (c2.checkbox("✅ Taken", key=f"taken_{med_id}"),
+                             c3.checkbox("❌ Missed", key=f"missed_{med_id}"))
+        save = st.form_submit_button("💾 Save today's logs")
+
+    if save:
+        now_iso = datetime.utcnow().isoformat()
+        rows = []
+        for med_id, (taken, missed) in ticks.items():
+            if taken:
+                rows.append((recipient_id, med_id, today_str, "taken", now_iso))
+            if missed:
+                rows.append((recipient_id, med_id, today_str, "missed", now_iso))
+        if rows:
+            execute_many("""
+                INSERT INTO med_log (recipient_id, medication_id, log_date, status, logged_at)
+                VALUES (?,?,?,?,?)
+            """, rows)
+            st.success(f"Saved {len(rows)} log(s).")
+        else:
+            st.info("Nothing ticked — no logs saved.")
     st.markdown("</div>", unsafe_allow_html=True)
 
     st.markdown("<div class='card'><h3>Medication log (last 14 days)</h3></div>", unsafe_allow_html=True)
@@ -612,10 +877,10 @@ def page_medications(recipient_id):
         SELECT ml.log_date, m.med_name, ml.status, ml.logged_at
         FROM med_log ml
         JOIN medications m ON m.id = ml.medication_id
-        WHERE m.recipient_id = ?
-          AND date(ml.log_date) >= date('now','-14 day')
-        ORDER BY date(ml.log_date) DESC, ml.logged_at DESC
-    """, [recipient_id])
+        WHERE ml.recipient_id = ?
+          AND ml.log_date >= ?
+        ORDER BY ml.log_date DESC, ml.logged_at DESC
+    """, [recipient_id, (date.today() - timedelta(days=14)).isoformat()])
 
     if logs.empty:
         st.write("No logs yet.")
@@ -648,7 +913,8 @@ def page_appointments(recipient_id):
         execute("""
             INSERT INTO appointments (recipient_id, appt_datetime, provider, purpose, location, notes, created_at)
             VALUES (?,?,?,?,?,?,?)
-        """, [recipient_id, dt.isoformat(), provider.strip(), purpose.strip(), location.strip(), notes.strip(), datetime.utcnow().isoformat()])
+        """, [recipient_id, dt.isoformat(), provider.strip(), purpose.strip(), location.strip(), notes.strip(),
+               datetime.utcnow().isoformat()])
         st.success("Appointment added.")
 
     st.markdown("<div class='card'><h3>Appointments (recent + upcoming)</h3></div>", unsafe_allow_html=True)
@@ -656,7 +922,7 @@ def page_appointments(recipient_id):
         SELECT appt_datetime, provider, purpose, location, notes
         FROM appointments
         WHERE recipient_id = ?
-        ORDER BY datetime(appt_datetime) DESC
+        ORDER BY appt_datetime DESC
         LIMIT 50
     """, [recipient_id])
 
@@ -688,7 +954,8 @@ def page_checkins(recipient_id):
         execute("""
             INSERT INTO checkins (recipient_id, checkin_date, symptoms, symptom_severity, caregiver_stress, free_text, created_at)
             VALUES (?,?,?,?,?,?,?)
-        """, [recipient_id, cdate.isoformat(), symptoms.strip(), int(severity), int(caregiver_stress), free_text.strip(), datetime.utcnow().isoformat()])
+        """, [recipient_id, cdate.isoformat(), symptoms.strip(), int(severity), int(caregiver_stress), free_text.strip(),
+               datetime.utcnow().isoformat()])
         st.success("Check-in saved.")
 
     st.markdown("<div class='card'><h3>Recent check-ins</h3></div>", unsafe_allow_html=True)
@@ -696,7 +963,7 @@ def page_checkins(recipient_id):
         SELECT checkin_date, symptom_severity, caregiver_stress, symptoms, free_text
         FROM checkins
         WHERE recipient_id = ?
-        ORDER BY date(checkin_date) DESC
+        ORDER BY checkin_date DESC
         LIMIT 30
     """, [recipient_id])
 
@@ -708,7 +975,8 @@ def page_checkins(recipient_id):
 def page_dashboard(recipient_id, recipient_name):
     st.markdown("<div class='card'><h3>Dashboard</h3><div class='muted'>AI summary + risks + trends</div></div>", unsafe_allow_html=True)
 
-    summary_lines, actions, flags, status, adherence_rate, taken, missed, latest_sev, max_stress = build_ai_summary(recipient_id)
+    version = data_version()
+    summary_lines, actions, flags, status, adherence_rate, taken, missed, latest_sev, max_stress = build_ai_summary(recipient_id, version)
 
     # KPI metrics row
     c1, c2, c3, c4 = st.columns(4)
@@ -739,20 +1007,15 @@ def page_dashboard(recipient_id, recipient_name):
 
     # PDF Export
     st.markdown("<div class='card'><h3>🧾 Doctor visit export</h3><div class='muted'>One-click summary for appointments</div><hr/>", unsafe_allow_html=True)
-    pdf_name = f"doctor_summary_{recipient_id}.pdf"
-
-    if st.button("Generate PDF Summary"):
-        generate_doctor_summary_pdf(pdf_name, recipient_name, summary_lines, actions, flags)
-        st.success("PDF generated. Use the download button below.")
-
-    if os.path.exists(pdf_name):
-        with open(pdf_name, "rb") as f:
-            st.download_button(
-                label="Download Doctor Summary (PDF)",
-                data=f,
-                file_name=pdf_name,
-                mime="application/pdf"
-            )
+
+    flag_rows = tuple((f["level"], f["title"], f["detail"]) for f in flags)
+    st.download_button(
+        label="Download Doctor Summary (PDF)",
+        data=cached_pdf_bytes(recipient_id, version, recipient_name,
+                              tuple(summary_lines), tuple(actions), flag_rows),
+        file_name=f"doctor_summary_{recipient_id}.pdf",
+        mime="application/pdf"
+    )
     st.markdown("</div>", unsafe_allow_html=True)
 
 # -------------------------
@@ -768,7 +1031,7 @@ def main():
     st.sidebar.markdown("### Navigation")
     page = st.sidebar.radio(
         "Go to",
-        ["📊 Dashboard", "👤 Profile", "💊 Medications", "📅 Appointments", "📝 Daily Check-in"],
+        NAV_PAGES,
         label_visibility="collapsed"
     )
 